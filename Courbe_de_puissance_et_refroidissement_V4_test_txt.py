@@ -137,11 +137,149 @@ def extraire_regime(nom_fichier):
     
     return None
 
-def analyser_fichiers_liste(fichiers_liste, periode_secondes=60):
+# Seuils de stabilité par défaut (CV en %, dérive en unité/s, crête-à-crête en unité).
+# Une valeur None désactive le critère correspondant.
+SEUILS_STABILITE_DEFAUT = {
+    'cv_stable': 1.0,
+    'cv_moyen': 2.0,
+    'derive_max': None,
+    'crete_a_crete_max': None,
+}
+
+# Surcharges par voie, ex: {'T_EAU_S_MOTEUR_A08': {'derive_max': 0.05}}
+SEUILS_STABILITE_CANAUX = {}
+
+# Colonnes de temps à ne pas soumettre au contrôle de stabilité
+COLONNES_EXCLUES_STABILITE = ['Heure', 'secondes']
+
+# Rang d'affichage des voies non stables (0 = la plus instable)
+RANG_STATUT_NON_STABLE = {'INSTABLE': 0, 'MOYENNEMENT STABLE': 1}
+
+def verifier_seuils_stabilite(seuils_canaux):
+    """Lève ValueError si une surcharge de seuils contient une clé inconnue ou des bornes CV incohérentes."""
+    for canal, seuils in (seuils_canaux or {}).items():
+        inconnues = [cle for cle in seuils if cle not in SEUILS_STABILITE_DEFAUT]
+        if inconnues:
+            raise ValueError(f"Seuil(s) de stabilite inconnu(s) pour {canal}: {', '.join(inconnues)}")
+        cv_stable = seuils.get('cv_stable', SEUILS_STABILITE_DEFAUT['cv_stable'])
+        cv_moyen = seuils.get('cv_moyen', SEUILS_STABILITE_DEFAUT['cv_moyen'])
+        if cv_stable is not None and cv_moyen is not None and cv_stable > cv_moyen:
+            raise ValueError(f"Seuils CV incoherents pour {canal}: cv_stable ({cv_stable}) > cv_moyen ({cv_moyen})")
+
+def calculer_stabilite(df_numerique, colonnes, temps=None, seuils_canaux=None):
+    """Calcule CV, dérive et crête-à-crête de toutes les colonnes en une passe sur la matrice de la fenêtre.
+
+    seuils_canaux: dict {canal: {cle: seuil}} surchargeant SEUILS_STABILITE_DEFAUT canal par canal,
+    supposé déjà contrôlé par verifier_seuils_stabilite().
+    La dérive est la pente des moindres carrés en fonction de `temps` (secondes); elle vaut NaN
+    si aucun temps n'est disponible.
+    """
+    seuils_canaux = seuils_canaux or {}
+    colonnes = list(colonnes)
+    matrice = df_numerique[colonnes].to_numpy(dtype=float)
+    valide = ~np.isnan(matrice)
+    nb_valeurs = valide.sum(axis=0)
+
+    if temps is not None:
+        x = pd.to_numeric(pd.Series(temps), errors='coerce').to_numpy(dtype=float)
+    else:
+        x = np.full(len(matrice), np.nan)
+    # Les échantillons sans temps sont exclus du calcul de pente uniquement
+    valide_pente = valide & ~np.isnan(x)[:, None]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        somme = np.where(valide, matrice, 0.0).sum(axis=0)
+        moyenne = somme / nb_valeurs
+        ecarts = np.where(valide, matrice - moyenne, 0.0)
+        ecart_type = np.sqrt((ecarts ** 2).sum(axis=0) / (nb_valeurs - 1))
+        ecart_type[nb_valeurs < 2] = np.nan
+        cv = ecart_type / np.abs(moyenne) * 100
+        cv[moyenne == 0] = np.nan
+
+        maxi = np.where(valide, matrice, -np.inf).max(axis=0, initial=-np.inf)
+        mini = np.where(valide, matrice, np.inf).min(axis=0, initial=np.inf)
+        crete_a_crete = np.where(nb_valeurs > 0, maxi - mini, np.nan)
+
+        x_mat = np.where(valide_pente, np.nan_to_num(x)[:, None], 0.0)
+        y_mat = np.where(valide_pente, matrice, 0.0)
+        n = valide_pente.sum(axis=0)
+        sx = x_mat.sum(axis=0)
+        sy = y_mat.sum(axis=0)
+        sxx = (x_mat ** 2).sum(axis=0)
+        sxy = (x_mat * y_mat).sum(axis=0)
+        denominateur = n * sxx - sx ** 2
+        derive = np.where((n >= 2) & (denominateur != 0), (n * sxy - sx * sy) / denominateur, np.nan)
+
+    def seuils_par_canal(cle):
+        return np.array([
+            seuils_canaux.get(col, {}).get(cle, SEUILS_STABILITE_DEFAUT[cle]) for col in colonnes
+        ], dtype=float)
+
+    cv_stable = seuils_par_canal('cv_stable')
+    cv_moyen = seuils_par_canal('cv_moyen')
+    derive_max = seuils_par_canal('derive_max')
+    crete_max = seuils_par_canal('crete_a_crete_max')
+
+    # Les comparaisons avec NaN (seuil None ou valeur indéfinie) valent False
+    hors_derive = np.abs(derive) > derive_max
+    hors_crete = crete_a_crete > crete_max
+    evaluable = (
+        ~np.isnan(cv)
+        | (~np.isnan(derive) & ~np.isnan(derive_max))
+        | (~np.isnan(crete_a_crete) & ~np.isnan(crete_max))
+    )
+    statut = np.select(
+        [hors_derive | hors_crete | (cv >= cv_moyen), cv >= cv_stable, ~evaluable],
+        ['INSTABLE', 'MOYENNEMENT STABLE', 'INDETERMINE'],
+        default='STABLE'
+    )
+
+    return pd.DataFrame({
+        'canal': colonnes,
+        'nb_valeurs': nb_valeurs,
+        'moyenne': moyenne,
+        'ecart_type': ecart_type,
+        'cv': cv,
+        'derive': derive,
+        'crete_a_crete': crete_a_crete,
+        'statut': statut,
+    })
+
+def trier_non_stables(tableau):
+    """Extrait les voies non stables, triées par gravité du statut puis par CV décroissant."""
+    non_stables = tableau[tableau['statut'].isin(list(RANG_STATUT_NON_STABLE))]
+    rang = non_stables['statut'].map(RANG_STATUT_NON_STABLE)
+    return non_stables.assign(_rang=rang).sort_values(
+        ['_rang', 'cv'], ascending=[True, False], na_position='first'
+    ).drop(columns='_rang')
+
+def formater_stabilite(tableau):
+    """Convertit un tableau de stabilité en lignes de texte: voies non stables, les plus instables en premier."""
+    icones = {'MOYENNEMENT STABLE': '⚠️', 'INSTABLE': '❌'}
+    messages = []
+    for ligne in trier_non_stables(tableau).itertuples(index=False):
+        details = []
+        if pd.notna(ligne.cv):
+            details.append(f"CV={ligne.cv:.2f}%")
+        if pd.notna(ligne.derive):
+            details.append(f"dérive={ligne.derive:.4g}/s")
+        details.append(f"crête-à-crête={ligne.crete_a_crete:.4g}")
+        messages.append(f"      {icones[ligne.statut]} {ligne.canal}: {ligne.statut} ({', '.join(details)})")
+    nb_stables = int((tableau['statut'] == 'STABLE').sum())
+    resume = f"      ✅ {nb_stables}/{len(tableau)} voies stables"
+    indeterminees = tableau.loc[tableau['statut'] == 'INDETERMINE', 'canal'].tolist()
+    if indeterminees:
+        resume += f", {len(indeterminees)} indéterminée(s): {', '.join(indeterminees)}"
+    messages.append(resume)
+    return messages
+
+def analyser_fichiers_liste(fichiers_liste, periode_secondes=60, seuils_stabilite=None):
     moyennes_fichiers = []
     colonnes_finales = []
     unites_finales = []
     resultats_cv = []
+    tableaux_stabilite = []
+    verifier_seuils_stabilite(seuils_stabilite)
     
     print(f"\nAnalyse de {len(fichiers_liste)} fichiers...")
     print(f"Période de moyennage: {periode_secondes} secondes")
@@ -239,35 +377,29 @@ def analyser_fichiers_liste(fichiers_liste, periode_secondes=60):
         
         moyennes = df_numerique[colonnes_numeriques].mean(skipna=True).to_frame().T
         
-        # Calcul écart-type pour vérifier la stabilité
-        ecarts_types = df_numerique[colonnes_numeriques].std(skipna=True)
+        # Vérification de la stabilité sur toutes les voies numériques
         print(f"   Vérification de la stabilité:")
         resultats_cv.append("   Vérification de la stabilité:")
         
-        colonnes_importantes = ['T_AMBIANCE_01','T_AIR_E_FILTRE_A01','T_AIR_S_FILTRE_A02','T_AIR_S_TURBO_A03','T_AIR_E_MOTEUR_A04','T_FUEL_E_MOTEUR_A05','T_FUEL_E_RADIA_A06','T_FUEL_S_RADIA_A07','T_EAU_S_MOTEUR_A08', 
-                                'T_EAU_E_MOTEUR_A09','EngineOilTemperature','TransOilTemp','T_HUILE_TRANS_A11','T_HUILE_TRANS_E_RADIA_A12','T_GAZ_ECHAPPEMENT_A15','R_CS.QFUKGH','R_EC.TORQUE','EngSpeed']
-        colonnes_a_verifier = [c for c in colonnes_importantes if c in colonnes_numeriques]
+        colonnes_a_verifier = [c for c in colonnes_numeriques if c not in COLONNES_EXCLUES_STABILITE]
+        temps = df_numerique['secondes'] if 'secondes' in df_numerique.columns else None
+        stabilite = calculer_stabilite(df_numerique, colonnes_a_verifier, temps=temps,
+                                       seuils_canaux=seuils_stabilite)
         
-        for col in colonnes_a_verifier:
-            if col in ecarts_types.index and moyennes[col].iloc[0] != 0:
-                cv = (ecarts_types[col] / abs(moyennes[col].iloc[0])) * 100
-                
-                if cv < 1:
-                    message_cv = f"      ✅ {col}: STABLE (CV={cv:.2f}%)"
-                elif cv < 2:
-                    message_cv = f"      ⚠️ {col}: MOYENNEMENT STABLE (CV={cv:.2f}%)"
-                else:
-                    message_cv = f"      ❌ {col}: INSTABLE (CV={cv:.2f}%)"
-                print(message_cv)
-                resultats_cv.append(message_cv)
+        for message_cv in formater_stabilite(stabilite):
+            print(message_cv)
+            resultats_cv.append(message_cv)
         
         moyennes['fichier_source'] = os.path.basename(fichier)
         regime = extraire_regime(os.path.basename(fichier))
         moyennes['regime_moteur'] = regime
         moyennes_fichiers.append(moyennes)
+        stabilite['fichier_source'] = os.path.basename(fichier)
+        stabilite['regime_moteur'] = regime
+        tableaux_stabilite.append(stabilite)
     
     if len(moyennes_fichiers) == 0:
-        return None, None, resultats_cv
+        return None, None, resultats_cv, None
     
     if 'fichier_source' not in colonnes_finales:
         colonnes_finales.append('fichier_source')
@@ -322,9 +454,10 @@ def analyser_fichiers_liste(fichiers_liste, periode_secondes=60):
     
     print(f"\nAnalyse terminee: {len(resultat_final)} lignes")
     resultats_cv.append(f"\nAnalyse terminee: {len(resultat_final)} lignes")
-    return resultat_final, (colonnes_finales, unites_finales), resultats_cv
+    tableau_stabilite = pd.concat(tableaux_stabilite, ignore_index=True, sort=False)
+    return resultat_final, (colonnes_finales, unites_finales), resultats_cv, tableau_stabilite
 
-def generer_dashboard_html(resultat_final, colonnes_info):
+def generer_dashboard_html(resultat_final, colonnes_info, tableau_stabilite=None):
     colonnes_finales, unites_finales = colonnes_info
     colonnes_tableau = ['regime_moteur', 'u8_Angle','u8_AngleSetpoint','T_AMBIANCE_01','T_SOUFFLAGE_CAISSONS','AVG_PUISSANCE', 'R_CS.QFUKGH','C_CAL.CONSO', 'C_CAL.DEBIT_VOL','C_CAL.DEBIT_MASS','BarometricPress','T_AIR_E_MOTEUR_A04', 'T_EAU_S_MOTEUR_A08', 'EngineOilTemperature',
     'EngCoolantTemp','EngineOilTemperature','EngineIntakeManifold1AirTemp','TAA_AIR', 'TAA_EAU', 'TAA_HUILE', 'fichier_source']
@@ -460,6 +593,30 @@ def generer_dashboard_html(resultat_final, colonnes_info):
         html += '</tr>'
     html += '</tbody></table>'
     
+    # Voies non stables, triées par gravité puis par CV décroissant
+    if tableau_stabilite is not None:
+        instables = trier_non_stables(tableau_stabilite)
+        colonnes_stabilite = ['fichier_source', 'regime_moteur', 'canal', 'statut', 'cv', 'derive', 'crete_a_crete']
+        html += f'<h2>Voies non stables ({len(instables)})</h2>'
+        html += '<table id="stabiliteTable"><thead><tr>'
+        for col in colonnes_stabilite:
+            html += f'<th>{col.replace("_", " ")}</th>'
+        html += '</tr></thead><tbody>'
+        for idx, row in instables.iterrows():
+            html += '<tr>'
+            for col in colonnes_stabilite:
+                val = row[col]
+                if pd.isna(val):
+                    html += '<td>-</td>'
+                elif col == 'regime_moteur':
+                    html += f'<td>{int(val)}</td>'
+                elif col in ['fichier_source', 'canal', 'statut']:
+                    html += f'<td>{val}</td>'
+                else:
+                    html += f'<td>{val:.4g}</td>'
+            html += '</tr>'
+        html += '</tbody></table>'
+    
     for i, graph_json in enumerate(graphs_html):
         html += f'<div style="margin:30px 0;"><div id="graph{i}"></div></div>'
     
@@ -576,9 +733,10 @@ class InterfaceAnalyse:
     def executer_analyse(self):
         try:
             periode = self.periode_var.get()
-            resultat_final, colonnes_info, resultats_cv = analyser_fichiers_liste(
+            resultat_final, colonnes_info, resultats_cv, tableau_stabilite = analyser_fichiers_liste(
                 self.fichiers_selectionnes, 
-                periode_secondes=periode
+                periode_secondes=periode,
+                seuils_stabilite=SEUILS_STABILITE_CANAUX
             )
             if resultat_final is None:
                 self.window.after(0, self.afficher_aucun_resultat)
@@ -592,7 +750,7 @@ class InterfaceAnalyse:
             nom_fichier_excel = "fichier_concatene_moyennes_complet.xlsx"
             df_export.to_excel(nom_fichier_excel, index=False, header=False)
             
-            html_content = generer_dashboard_html(resultat_final, colonnes_info)
+            html_content = generer_dashboard_html(resultat_final, colonnes_info, tableau_stabilite)
             nom_fichier_html = "dashboard_analyse_moteur.html"
             with open(nom_fichier_html, 'w', encoding='utf-8') as f:
                 f.write(html_content)